@@ -1,6 +1,8 @@
 
+import io
+import sys
 import pytest
-from webvtt import WebVTTParser
+from webvtt import WebVTTParser, WebVTTCueTextParser
 from pprint import pprint
 
 good_vtt_data ="""WEBVTT
@@ -46,6 +48,26 @@ def test_validate_header_invalid():
     assert result != []
     return result
 
+@pytest.mark.parametrize('header, valid', [
+    ('\ufeffWEBVTT', True),
+    ('WEBVTT - some title', True),
+    ('WEBVTT\tsome title', True),
+    ('WEBVTTX', False),
+    ('\ufeffWEBVTTX', False),
+    ('webvtt', False),
+    (' WEBVTT', False),
+])
+def test_validate_header_variants(header, valid):
+    parser = WebVTTParser()
+    result = parser.parse(header)
+    assert (result == []) == valid
+
+def test_validate_empty_file():
+    parser = WebVTTParser()
+    result = parser.parse('')
+    assert result == [{'line': 1, 'message': 'No valid signature. (File needs to start with "WEBVTT".'}]
+    return result
+
 def test_validate_cues_valid():
     parser = WebVTTParser()
     result = parser.parse(good_vtt_data)
@@ -58,5 +80,104 @@ def test_validate_cues_invalid():
     assert result != []
     return result
 
+@pytest.mark.parametrize('timings', [
+    '00:01.000 --> 00:02.500',
+    '0:00:01.000 --> 0:00:02.000',
+    '01:59:59.999 --> 02:00:00.000',
+    '100:00:00.000 --> 100:00:00.001',
+])
+def test_validate_timestamp_formats(timings):
+    parser = WebVTTParser()
+    result = parser.parse(f'WEBVTT\n\n{timings}\ntext\n')
+    assert result == []
+
+@pytest.mark.parametrize('timestamp, message', [
+    ('00:00:01.0000', 'Milliseconds must be given in three digits.'),
+    ('00:00:001.000', 'Must be exactly two digits.'),
+    ('00:01:\u0663\u0663.000', 'Must be exactly two digits.'),
+    ('000:01.000', 'No seconds found or minutes is greater than 59.'),
+])
+def test_validate_timestamp_digits(timestamp, message):
+    parser = WebVTTParser()
+    result = parser.parse(f'WEBVTT\n\n{timestamp} --> 00:00:09.000\n')
+    assert result == [{'line': 3, 'message': message}]
+
+@pytest.mark.parametrize('settings, messages', [
+    ('line:-1', []),
+    ('line:50.5%,end', []),
+    ('line:101%', ['Line position cannot be >100%.']),
+    ('size:50% size:40%', ['Duplicate setting.']),
+    ('align', ['Invalid setting.']),
+    ('align:', ['No value for setting defined.']),
+    ('foo size:500% align:bogus', ['Invalid setting.', 'Size cannot be >100%.',
+        "Alignment can only be set to one of ('start', 'center', 'end', 'left', 'right')."]),
+    ('position:45.5%', []),
+    ('size:50.5%', []),
+    ('size:abc%', ['Size needs to be a number']),
+])
+def test_validate_cue_settings(settings, messages):
+    parser = WebVTTParser()
+    result = parser.parse(f'WEBVTT\n\n00:00:01.000 --> 00:00:02.000 {settings}\ntext\n')
+    assert [error['message'] for error in result] == messages
+
+@pytest.mark.parametrize('newline', ['\r\n', '\r'])
+def test_validate_line_endings(newline):
+    parser = WebVTTParser()
+    assert parser.parse(good_vtt_data.replace('\n', newline)) == []
+    assert parser.parse(bad_vtt_data.replace('\n', newline)) == parser.parse(bad_vtt_data)
+
+def test_validate_bad_cue_at_end_of_file():
+    parser = WebVTTParser()
+    result = parser.parse('WEBVTT\n\n00:00:01.00 --> 00:00:02.000')
+    assert result == [{'line': 3, 'message': 'Milliseconds must be given in three digits.'}]
+    return result
+
+def test_validate_stream_matches_parse():
+    parser = WebVTTParser()
+    for data in (good_vtt_data, bad_vtt_data, bad_vtt_data.replace('\n', '\r\n')):
+        result = list(parser.parse_stream(io.StringIO(data, newline='')))
+        assert result == parser.parse(data)
+    return result
+
+def test_validate_unopened_end_tag():
+    parser = WebVTTParser()
+    result = parser.parse('WEBVTT\n\n00:00:01.000 --> 00:00:02.000\nsome</c> <rt>text\n')
+    assert [error['message'] for error in result] == ['Incorrect end tag.', 'Incorrect start tag.']
+    return result
+
+def test_validate_unterminated_tag():
+    parser = WebVTTParser()
+    result = parser.parse('WEBVTT\n\n00:00:01.000 --> 00:00:02.000\nsome <c.yellow')
+    assert [error['message'] for error in result] == ['Required end tag missing.']
+    return result
+
+def test_cue_text_longest_entity_wins():
+    errors = []
+    entities = {'&not': '\u00ac', '&notin': '\u2209'}
+    tree = WebVTTCueTextParser('a &notin; b &notit;', errors.append, '', entities).parse(0, 1)
+    assert [node.value for node in tree.children] == ['a \u2209; b \u00acit;']
+    assert errors == []
+    return tree
+
+def test_cue_text_deeply_nested_tags():
+    errors = []
+    depth = sys.getrecursionlimit() * 2
+    text = '<b>' * depth + 'text' + '</b>' * depth + 'tail'
+    tree = WebVTTCueTextParser(text, errors.append, '', {}).parse(0, 1)
+    # walk down without recursion, the tree is deeper than the recursion limit
+    node = tree.children[0]
+    levels = 0
+    while node.type == 'object':
+        assert node.name == 'b' and len(node.children) == 1
+        node = node.children[0]
+        levels += 1
+    assert levels == depth
+    assert node.value == 'text'
+    # the closing tags unwound the stack, so the trailing text lands on the root
+    assert [child.type for child in tree.children] == ['object', 'text']
+    assert tree.children[1].value == 'tail'
+    assert errors == []
+    return tree
+
 if __name__ == '__main__':
     pprint(test_validate_cues_invalid())
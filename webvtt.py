@@ -2,9 +2,40 @@
 Simple webVTT validation module based on https://github.com/w3c/webvtt.js
 """
 from dataclasses import dataclass
+from math import isfinite
+from typing import Iterable, Iterator, Optional, Tuple
 import re
-
-@dataclass
+import sys
+
+_DIGITS_RE = re.compile(r'[0-9]*')
+_SPACE_RE = re.compile(r'[ \t]*')
+_TIMESTAMP_RE = re.compile(r'(?:([0-9]+):)?([0-5][0-9]):([0-5][0-9])\.([0-9]{3})(?![0-9])')
+_LINE_POSITION_RE = re.compile(r'^[-\d](\d*)(\.\d+)?%?$')
+_ESCAPE_RUN_RE = re.compile(r'[a-z#0-9]+', re.IGNORECASE)
+_TEXT_RUN_RE = re.compile(r'[^&<]+')
+_TAG_NAME_RUN_RE = re.compile(r'[^ \t\n\f.>]+')
+_TAG_REST_RUN_RE = re.compile(r'[^>]+')
+_DECIMAL_ENTITY_RE = re.compile(r'^&#([0-9]+)$')
+_NUMERIC_ENTITY_RE = re.compile(r'^&#(x?[0-9]+)$')
+_SIGNATURE = 'WEBVTT'
+_SIGNATURE_BOM = '\ufeff' + _SIGNATURE
+_NORMALIZE_TABLE = str.maketrans({'\u0000': '\uFFFD', '\u000D': '\u000A'})
+_DIRECTIONS = ('rl', 'lr')
+_LINE_ALIGNS = ('start', 'center', 'end')
+_POSITION_ALIGNS = ('line-left', 'center', 'line-right')
+_ALIGN_VALUES = ('start', 'center', 'end', 'left', 'right')
+# dataclass(slots=True) needs Python 3.10, older versions fall back to a regular dataclass
+_DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(**_DATACLASS_SLOTS)
+class Node():
+    type: str
+    name: Optional[str] = None
+    classes: Optional[list] = None
+    value: object = None
+    children: Optional[list] = None
+
+@dataclass(**_DATACLASS_SLOTS)
 class Cue():
     id: str = ''
     start_time: int = 0
@@ -19,9 +50,50 @@ class Cue():
     size: int = 100
     alignment: str = 'center'
     text: str = ''
-    tree: bool = None
+    tree: Optional[Node] = None
     non_serializable: bool = False
 
+def _normalize_line(line: str) -> str:
+    """Strip one trailing line terminator and replace \\0 the way parse() does."""
+    if line.endswith('\u000A'):
+        line = line[:-2] if line.endswith('\u000D\u000A') else line[:-1]
+    elif line.endswith('\u000D'):
+        line = line[:-1]
+    return line.replace('\u0000', '\uFFFD')
+
+def _scan_block(lines: Iterator[str], line: Optional[str], line_pos: int,
+                collected: Optional[list]=None) -> Tuple[Optional[str], int, bool]:
+    """
+    Advance through lines until a blank line, the end of input or a line containing
+    "-->". Returns that line, its position and whether it contains "-->". Lines
+    passed over are appended to collected, if given.
+    """
+    while line:
+        if '-->' in line:
+            return line, line_pos, True
+        if collected is not None:
+            collected.append(line)
+        line_pos += 1
+        line = next(lines, None)
+    return line, line_pos, False
+
+def _is_finite_number(value: str) -> bool:
+    try:
+        return isfinite(float(value))
+    except ValueError:
+        return False
+
+def _compile_entities(entities: dict) -> Optional[re.Pattern]:
+    """Build a pattern matching the longest entity name at the start of a string."""
+    names = sorted(entities, key=len, reverse=True)
+    return re.compile('|'.join(map(re.escape, names))) if names else None
+
+def _skip_space(line: str, pos: int) -> int:
+    """Return the position after the spaces and tabs starting at pos."""
+    m = _SPACE_RE.match(line, pos)
+    assert m is not None  # [ \t]* matches the empty string
+    return m.end()
+
 class WebVTTParser():
 
     def __init__(self, entities: dict={}) -> None:
@@ -34,217 +106,208 @@ class WebVTTParser():
                 '&rlm': '\u200f',
                 '&nbsp': '\u00A0'
         }
+        self.entities_re = _compile_entities(self.entities)
 
     def parse(self, input_vtt: str, mode: str='') -> list:
-        # global search and replace for \0
-        lf = '\u000A'
-        input_vtt = input_vtt.replace('\u0000', '\uFFFD')
-        input_vtt = input_vtt.replace('\u000D\u000A', lf)
-        input_vtt = input_vtt.replace('\u000D', lf)
-
+        # global search and replace for \0, CRLF and CR
+        input_vtt = input_vtt.replace('\u000D\u000A', '\u000A').translate(_NORMALIZE_TABLE)
+        return list(self._parse_lines(iter(input_vtt.split('\n')), mode))
+
+    def parse_stream(self, lines: Iterable[str], mode: str='') -> Iterator[dict]:
+        """
+        Validate WebVTT given as an iterable of lines (e.g. an open text file) and
+        yield errors as they are found instead of reading the whole input first.
+        Each line may still end in its line terminator.
+        """
+        return self._parse_lines(map(_normalize_line, lines), mode)
+
+    def _parse_lines(self, lines: Iterator[str], mode: str) -> Iterator[dict]:
         errors = []
-        cues = []
-        line_pos = 1
-        lines = { key:value for key, value in enumerate(input_vtt.split(sep='\n'), start=1) }
+        line_pos = 0
+        previous_cue_start = 0
         already_collected = False
 
         def err(message: str) -> None:
-            errors.append({'line': line_pos, 'message': message  })
-
-        line = lines.get(line_pos)
-        line_length = len(line)
-        signature = 'WEBVTT'
-        bom = 0
-        signature_length = len(signature)
-
-        # Byte order mark
-        if line[0]=='\ufeff':
-            bom = 1
-            signature_length += 1
-
-        # SIGNATURE
-        if (
-            line_length < signature_length or
-            line.find(signature) != 0+bom or
-            line_length > signature_length and
-            line[signature_length] != ' ' and
-            line[signature_length] != '\t'
-        ):
-            err(f'No valid signature. (File needs to start with "{signature}".')
+            errors.append({'line': line_pos+1, 'message': message  })
+
+        # declared apart from the first read, which can only give a str
+        line: Optional[str]
+        line = next(lines, '')
+
+        # SIGNATURE, optionally preceded by a byte order mark
+        if line.startswith(_SIGNATURE_BOM):
+            signature_end = len(_SIGNATURE_BOM)
+        elif line.startswith(_SIGNATURE):
+            signature_end = len(_SIGNATURE)
+        else:
+            signature_end = None
+        if signature_end is None or line[signature_end:signature_end+1] not in ('', ' ', '\t'):
+            err(f'No valid signature. (File needs to start with "{_SIGNATURE}".')
+            if not line:
+                # empty file or leading blank line, there is nothing to validate
+                yield from errors
+                return
 
         line_pos += 1
+        line = next(lines, None)
 
 		# HEADER
-        while lines.get(line_pos) != '' and lines.get(line_pos) is not None:
+        while line:
             err('No blank line after the signature.')
-            if lines.get(line_pos).find('-->') != -1:
+            if '-->' in line:
                 already_collected = True
                 break
             line_pos +=1
+            line = next(lines, None)
+
+        # one timings parser is reset for every cue and inline timestamp instead of constructed anew
+        timings = WebVTTCueTimingsAndSettingsParser('', err)
 
         # CUE LOOP
-        while lines.get(line_pos) is not None:
-            while not already_collected and lines.get(line_pos) == '':
-                line_pos += 1
-            if not already_collected and lines.get(line_pos) is None:
-                break
+        while line is not None:
+            if not already_collected:
+                while line == '':
+                    line_pos += 1
+                    line = next(lines, None)
+                if line is None:
+                    break
+
+            # hand over what has been found so far before starting on the next cue
+            if errors:
+                yield from errors
+                errors.clear()
 
             # CUE CREATION
             cue =  Cue()
             parse_timings = True
 
-            if lines[line_pos].find('-->') == -1:
-                cue.id = lines[line_pos]
+            if '-->' not in line:
+                cue.id = line
 
                 # COMMENTS
                 #   Not part of the specification's parser as these would just be ignored. However,
                 #   we want them to be conforming and not get "Cue identifier cannot be standalone".
                 if cue.id.startswith('NOTE'):
                     line_pos += 1
-                    while lines.get(line_pos) != '' and lines.get(line_pos) is not None:
-                        if lines.get(line_pos).find('-->') != -1:
+                    line = next(lines, None)
+                    while line:
+                        if '-->' in line:
                             err('Cannot have timestamp in a comment.')
                         line_pos += 1
+                        line = next(lines, None)
                     continue
 
                 line_pos += 1
+                line = next(lines, None)
 
-                if lines.get(line_pos) == '' or lines.get(line_pos) is None:
+                if not line:
                     err('Cue identifier cannot be standalone.')
                     continue
 
-                if lines.get(line_pos).find('-->') == -1:
+                if '-->' not in line:
                     parse_timings = False
                     err('Cue identifier needs to be followed by timestamp.')
                     continue
 
             # TIMINGS
             already_collected = False
-            timings = WebVTTCueTimingsAndSettingsParser(lines[line_pos], err)
-            previous_cue_start = 0
-            if len(cues)>0:
-                previous_cue_start = cues[len(cues)-1].start_time
+            timings.reset(line, err)
 
             if parse_timings and not timings.parse(cue, previous_cue_start):
                 # BAD CUE
 
                 cue = None
                 line_pos += 1
+                line = next(lines, None)
 
                 # BAD CUE LOOP
-                while lines[line_pos] != '' and lines[line_pos] is not None:
-                    if lines[line_pos].find('-->') != -1:
-                        already_collected = True
-                        break
-                    line_pos += 1
+                line, line_pos, already_collected = _scan_block(lines, line, line_pos)
                 continue
+            previous_cue_start = cue.start_time
             line_pos += 1
+            line = next(lines, None)
 
             #/* CUE TEXT LOOP */
-            while lines.get(line_pos) != '' and lines.get(line_pos) is not None:
-                if lines[line_pos].find('-->') != -1:
-                    err('Blank line missing before cue.')
-                    already_collected = True
-                    break
-
-                if cue.text != '':
-                    cue.text += '\n'
-                cue.text += lines[line_pos]
-                line_pos += 1
+            text: list = []
+            line, line_pos, already_collected = _scan_block(lines, line, line_pos, text)
+            if already_collected:
+                err('Blank line missing before cue.')
+            cue.text = '\n'.join(text)
 
             #/* CUE TEXT PROCESSING */
-            cuetextparser = WebVTTCueTextParser(cue.text, err, mode, self.entities)
+            cuetextparser = WebVTTCueTextParser(cue.text, err, mode, self.entities, self.entities_re, timings)
             cue.tree = cuetextparser.parse(cue.start_time, cue.end_time)
-            cues.append(cue)
-
-        #cues.sort(function(a, b) {
-        #    if (a.startTime < b.startTime)
-        #    return -1
-        #    if (a.startTime > b.startTime)
-        #    return 1
-        #    if (a.endTime > b.endTime)
-        #    return -1
-        #    if (a.endTime < b.endTime)
-        #    return 1
-        #    return 0
-        #})
-        #/* END */
-
-        return errors
-
-class Struple(str):
-    def __new__(cls, value: str):
-        obj = str.__new__(cls, value)
-        obj.__value = tuple(value)
-        return obj
-
-    def __getitem__(self, key) -> str:
-        if isinstance(key, int):
-            if key<0:
-                key += len(self.__value)
-            if key<0 or key>=len(self.__value):
-                return None
-            return self.__value[key]
-        return super().__getitem__(key)
+
+        yield from errors
 
 class WebVTTCueTimingsAndSettingsParser():
     def __init__(self, line: str, error_handler: callable) -> None:
         super().__init__()
+        self.reset(line, error_handler)
 
-        self.SPACE = (' ', '\t')
-        self.DIGITS = '0123456789'
-        self.line = Struple(line)
+    def reset(self, line: str, error_handler: callable) -> None:
+        """Prepare the parser for a new line so one instance can be reused across cues."""
+        self.line = line
+        self._len = len(line)
         self.pos = 0
         self.err = error_handler
         self.space_before_setting = True
 
-    def skip(self, pattern: tuple):
-        while self.line[self.pos] and self.line[self.pos] in pattern:
-            self.pos += 1
+    def _peek(self) -> Optional[str]:
+        p = self.pos
+        return self.line[p] if p < self._len else None
 
-    def collect(self, pattern) -> str:
-        result_str = ''
-
-        while self.line[self.pos] and self.line[self.pos] in pattern:
-            result_str += self.line[self.pos]
-            self.pos += 1
-        return result_str
+    def collect_digits(self) -> str:
+        m = _DIGITS_RE.match(self.line, self.pos)
+        assert m is not None  # [0-9]* matches the empty string
+        self.pos = m.end()
+        return m.group()
 
     def timestamp(self):
+        # Well-formed timestamps are matched in one go; the step-by-step
+        # parse below only runs to work out which error to report.
+        m = _TIMESTAMP_RE.match(self.line, self.pos)
+        if m:
+            self.pos = m.end()
+            hours, minutes, seconds, millis = m.groups()
+            return int(hours or 0)*60*60 + int(minutes)*60 + int(seconds) + int(millis)/1000
+
         units = 'minutes'
         val1 = 0
         val2 = 0
         val3 = 0
         val4 = 0
         #// 3
-        if self.line[self.pos] is None:
+        c = self._peek()
+        if c is None:
             self.err('No timestamp found.')
             return
         #// 4
-        if self.line[self.pos] not in self.DIGITS:
+        if not '0' <= c <= '9':
             self.err('Timestamp must start with a character in the range 0-9.')
             return
         #// 5-7
-        val1 = self.collect(self.DIGITS)
+        val1 = self.collect_digits()
         if len(val1) > 2 or int(val1) > 59:
             units = 'hours'
         #// 8
-        if self.line[self.pos] != ':':
+        if self._peek() != ':':
             self.err('No time unit separator found.')
             return
         self.pos += 1
         #// 9-11
-        val2 = self.collect(self.DIGITS)
+        val2 = self.collect_digits()
         if len(val2) != 2:
             self.err('Must be exactly two digits.')
             return
         #// 12
-        if units == 'hours' or self.line[self.pos] == ':':
-            if self.line[self.pos] != ':':
+        c = self._peek()
+        if units == 'hours' or c == ':':
+            if c != ':':
                 self.err('No seconds found or minutes is greater than 59.')
                 return
             self.pos += 1
-            val3 = self.collect(self.DIGITS)
+            val3 = self.collect_digits()
             if len(val3) != 2:
                 self.err('Must be exactly two digits.')
                 return
@@ -256,12 +319,12 @@ class WebVTTCueTimingsAndSettingsParser():
             val2 = val1
             val1 = '0'
         #// 13
-        if self.line[self.pos] != '.':
+        if self._peek() != '.':
             self.err('No decimal separator (".") found.')
             return
         self.pos += 1
         #// 14-16
-        val4 = self.collect(self.DIGITS)
+        val4 = self.collect_digits()
         if len(val4) != 3:
             self.err('Milliseconds must be given in three digits.')
             return
@@ -276,40 +339,33 @@ class WebVTTCueTimingsAndSettingsParser():
 
     def parse_timestamp(self):
         ts = self.timestamp()
-        if self.line[self.pos] is not None:
+        if self._peek() is not None:
             self.err('Timestamp must not have trailing characters.')
             return None
         return ts
 
-    def is_number(self, value: str) -> bool:
-        from math import isinf, isnan
-        try:
-            num_value = float(value)
-        except ValueError:
-            return False
-        return not (isnan(num_value) or isinf(num_value))
-
     def parse_settings(self, input: str, cue: Cue):
         settings = input.split()
-        seen = []
+        seen = set()
         for i in range(len(settings)):
             if(settings[i] == ''):
                 continue
 
-            index = settings[i].find(':')
-            setting = settings[i][:index]
-            value = settings[i][index+1:]
+            setting, sep, value = settings[i].partition(':')
+            if not sep:
+                self.err('Invalid setting.')
+                continue
 
             if setting in seen:
                 self.err('Duplicate setting.')
-            seen.append(setting)
+            seen.add(setting)
 
             if value=='':
                 self.err('No value for setting defined.')
                 return
 
             if setting == 'vertical': # // writing direction
-                if value not in  ('rl','lr'):
+                if value not in _DIRECTIONS:
                     self.err('Writing direction can only be set to "rl" or "rl".')
                     continue
                 cue.direction = value
@@ -319,13 +375,13 @@ class WebVTTCueTimingsAndSettingsParser():
                     comp = value.split(',')
                     value = comp[0]
                     line_align = comp[1]
-                if not re.match(r'^[-\d](\d*)(\.\d+)?%?$', value):
+                if not _LINE_POSITION_RE.match(value):
                     self.err('Line position takes a number or percentage.')
                     continue
-                if value.find('-', start=1) != -1:
+                if '-' in value[1:]:
                     self.err('Line position can only have "-" at the start.')
                     continue
-                if value.find('%') != -1 and value.find('%') != len(value)-1:
+                if '%' in value[:-1]:
                     self.err('Line position can only have "%" at the end.')
                     continue
                 if value[0] == '-' and value[-1] == '%':
@@ -336,14 +392,14 @@ class WebVTTCueTimingsAndSettingsParser():
                 if value[-1] == '%':
                     is_percent = True
                     num_val = value[0:-1]
-                    if(int(num_val, 10) > 100):
+                    if(float(num_val) > 100):
                         self.err('Line position cannot be >100%.')
                         continue
-                if not self.is_number(num_val):
+                if not _is_finite_number(num_val):
                     self.err('Line position needs to be a number')
                     continue
                 if line_align != None:
-                    if line_align not in ('start', 'center', 'end'):
+                    if line_align not in _LINE_ALIGNS:
                         self.err('Line alignment needs to be one of start, center or end')
                         continue
                     cue.line_align = line_align
@@ -361,14 +417,14 @@ class WebVTTCueTimingsAndSettingsParser():
                     self.err('Text position must be a percentage.')
                     continue
                 num_val = value[:-1]
-                if not self.is_number(num_val):
+                if not _is_finite_number(num_val):
                     self.err('Line position needs to be a number')
                     continue
-                if int(num_val)>100 or int(num_val)<0:
+                if float(num_val)>100 or float(num_val)<0:
                     self.err('Text position needs to be between 0 and 100%.')
                     continue
                 if position_align is not None:
-                    if position_align not in ('line-left', 'center', 'line-right'):
+                    if position_align not in _POSITION_ALIGNS:
                         self.err('Position alignment needs to be one of line-left, center or line-right')
                         continue
                     cue.position_align = position_align
@@ -378,116 +434,110 @@ class WebVTTCueTimingsAndSettingsParser():
                     self.err('Size must be a percentage.')
                     continue
                 size = value[:-1]
-                if int(size)>100:
+                if not _is_finite_number(size): # undefined || size === "" || isNaN(size)) {
+                    self.err('Size needs to be a number')
+                    continue
+                if float(size)>100:
                     self.err('Size cannot be >100%.')
                     continue
-                if size is None: # undefined || size === "" || isNaN(size)) {
-                    self.err('Size needs to be a number')
-                    size = 100
+                if float(size)<0:
+                    self.err('Size needs to be between 0 and 100%.')
                     continue
-                else:
-                    size = float(size)
-                    if size<0 or size>100:
-                        self.err('Size needs to be between 0 and 100%.')
-                        continue
-                cue.size = size
+                cue.size = float(size)
             elif setting=='align': # // alignment
-                align_values = ('start', 'center', 'end', 'left', 'right')
-                if value not in align_values:
-                    self.err(f'Alignment can only be set to one of {align_values}.')
+                if value not in _ALIGN_VALUES:
+                    self.err(f'Alignment can only be set to one of {_ALIGN_VALUES}.')
                     continue
                 cue.alignment = value
             else:
                 self.err('Invalid setting.')
 
     def parse(self, cue: Cue, previous_cue_start: int):
-        self.skip(self.SPACE)
+        line = self.line
+        err = self.err
+        skip = _skip_space
 
-        cue.start_time = self.timestamp()
-        if cue.start_time is None:
+        self.pos = skip(line, self.pos)
+        cue.start_time = start_time = self.timestamp()
+        if start_time is None:
             return
-        if cue.start_time < previous_cue_start:
-            self.err('Start timestamp is not greater than or equal to start timestamp of previous cue.')
-        if self.line[self.pos] not in self.SPACE:
-            self.err('Timestamp not separated from "-->" by whitespace.')
-        self.skip(self.SPACE)
+        if start_time < previous_cue_start:
+            err('Start timestamp is not greater than or equal to start timestamp of previous cue.')
+        pos = self.pos
+        c = line[pos:pos+1]
+        if c != ' ' and c != '\t':
+            err('Timestamp not separated from "-->" by whitespace.')
+        pos = skip(line, pos)
         #// 6-8
-        if self.line[self.pos] != '-':
-            self.err('No valid timestamp separator found.')
+        if not line.startswith('-->', pos):
+            err('No valid timestamp separator found.')
             return
-
-        self.pos += 1
-        if self.line[self.pos] != '-':
-            self.err('No valid timestamp separator found.')
-            return
-        self.pos += 1
-        if self.line[self.pos] != '>':
-            self.err('No valid timestamp separator found.')
+        pos += 3
+        c = line[pos:pos+1]
+        if c != ' ' and c != '\t':
+            err('"-->" not separated from timestamp by whitespace.')
+        self.pos = skip(line, pos)
+        cue.end_time = end_time = self.timestamp()
+        if end_time is None:
             return
-        self.pos += 1
-        if self.line[self.pos] not in self.SPACE:
-            self.err('"-->" not separated from timestamp by whitespace.')
-        self.skip(self.SPACE)
-        cue.end_time = self.timestamp()
-        if cue.end_time is None:
-            return
-        if cue.end_time <= cue.start_time:
-            self.err('End timestamp is not greater than start timestamp.')
-        if self.line[self.pos] not in self.SPACE:
+        if end_time <= start_time:
+            err('End timestamp is not greater than start timestamp.')
+        pos = self.pos
+        c = line[pos:pos+1]
+        if c != ' ' and c != '\t':
             self.space_before_setting = False
-        self.skip(self.SPACE)
-        self.parse_settings(self.line[self.pos:], cue)
+        self.pos = pos = skip(line, pos)
+        self.parse_settings(line[pos:], cue)
         return True
 
 class WebVTTCueTextParser():
-    def __init__(self, line, error_handler: callable, mode: str, entities: dict) -> None:
+    def __init__(self, line, error_handler: callable, mode: str, entities: dict, entities_re: Optional[re.Pattern]=None,
+                 timings: Optional[WebVTTCueTimingsAndSettingsParser]=None) -> None:
         super().__init__()
-        self.line = Struple(line)
+        self.line: str = line
+        self._len: int = len(line)
+        # next_token() reads the sentinel at line[_len] instead of bounds checking each character
+        self._padded_line: str = line + '\u0000'
         self.pos: int = 0
         self.mode: str = mode
         self.entities: dict = entities
+        self.entities_re: Optional[re.Pattern] = entities_re or _compile_entities(entities)
         self.error_handler: callable = error_handler
+        self.timings: Optional[WebVTTCueTimingsAndSettingsParser] = timings
 
     def err(self, message: str) -> None:
         if self.mode != 'metadata':
             self.error_handler(message)
 
+    def _consume(self, pattern: re.Pattern) -> str:
+        """Advance over the run of pattern at pos, which the caller knows is non-empty."""
+        m = pattern.match(self.line, self.pos, self._len)
+        assert m is not None
+        self.pos = m.end()
+        return m.group()
+
     def parse(self, cue_start, cue_end):
-        result = {'children':[]}
+        result = Node('root', children=[])
         current = result
+        stack = [result]
         timestamps = []
 
-        def remove_cycles(tree: dict) -> dict:
-            cycleless_tree = {**tree}
-            if tree.get('children'):
-                cycleless_tree['children'] = map(remove_cycles, tree['children'])
-            cycleless_tree.pop('parent', None)
-            return cycleless_tree
-
         def attach(token) -> None:
             nonlocal current
-            data = {
-                'type': 'object',
-                'name': token[1],
-                'classes':token[2],
-                'children':[],
-                'parent': current
-            }
-            current['children'].append(data)
-            current = current['children'][len(current['children'])-1]
+            current = Node('object', token[1], token[2], children=[])
+            stack[-1].children.append(current)
+            stack.append(current)
 
         def in_scope(name: str) -> bool:
-            node = current
-            while node:
-                if node.get('name') == name:
+            for node in stack:
+                if node.name == name:
                     return True
-                node = node.get('parent')
             return False
 
-        while self.line[self.pos] is not None:
+        while self.pos < self._len:
             token = self.next_token()
             if token[0] == 'text':
-                current['children'].append({'type':'text', 'value':token[1], 'parent':current})
+                current.children.append(Node('text', value=token[1]))
             elif token[0] == 'start tag':
                 if self.mode == 'chapters':
                     self.err('Start tags not allowed in chapter title text.')
@@ -496,49 +546,54 @@ class WebVTTCueTextParser():
                     self.err('Only <v> and <lang> can have an annotation.')
                 if name in ('c', 'i', 'b', 'u', 'ruby'):
                     attach(token)
-                elif name == 'rt' and current['name'] == 'ruby':
+                elif name == 'rt' and current.name == 'ruby':
                     attach(token)
                 elif name == 'v':
                     if in_scope('v'):
                         self.err('<v> cannot be nested inside itself.')
                     attach(token)
-                    current['value'] = token[3] #// annotation
+                    current.value = token[3] #// annotation
                     if not token[3]:
                         self.err('<v> requires an annotation.')
                 elif name == 'lang':
                     attach(token)
-                    current['value'] = token[3] #// language
+                    current.value = token[3] #// language
                 else:
                     self.err('Incorrect start tag.')
             elif token[0] == 'end tag':
                 if self.mode == 'chapters':
                     self.err('End tags not allowed in chapter title text.')
                 #// XXX check <ruby> content
-                if token[1] == current['name']:
-                    current = current['parent']
-                elif token[1] == 'ruby' and current['name'] == 'rt':
-                    current = current['parent']['parent']
+                if token[1] == current.name:
+                    stack.pop()
+                    current = stack[-1]
+                elif token[1] == 'ruby' and current.name == 'rt':
+                    del stack[-2:]
+                    current = stack[-1]
                 else:
                     self.err('Incorrect end tag.')
             elif token[0] == 'timestamp':
                 if self.mode == 'chapters':
                     self.err('Timestamp not allowed in chapter title text.')
-                timings = WebVTTCueTimingsAndSettingsParser(token[1], self.err)
+                if self.timings is None:
+                    self.timings = WebVTTCueTimingsAndSettingsParser(token[1], self.err)
+                else:
+                    self.timings.reset(token[1], self.err)
+                timings = self.timings
                 timestamp = timings.parse_timestamp()
                 if timestamp is not None:
                     if(timestamp <= cue_start or timestamp >= cue_end):
                         self.err('Timestamp must be between start timestamp and end timestamp.')
                     if(len(timestamps) > 0 and timestamps[len(timestamps)-1] >= timestamp):
                         self.err('Timestamp must be greater than any previous timestamp.')
-                    current['children'].append({'type':'timestamp', 'value':timestamp, 'parent':current})
+                    current.children.append(Node('timestamp', value=timestamp))
                     timestamps.append(timestamp)
 
-        while current.get('parent'):
-            if current.get('name') != 'v':
+        for node in reversed(stack[1:]):
+            if node.name != 'v':
                 self.err('Required end tag missing.')
-            current = current.get('parent')
 
-        return remove_cycles(result)
+        return result
 
     def next_token(self) -> tuple:
         state = 'data'
@@ -549,22 +604,25 @@ class WebVTTCueTextParser():
         def from_char_code(*args: int) -> str:
             return ''.join(map(chr, args))
 
-        while self.line[self.pos-1] is not None or self.pos == 0:
-            c = self.line[self.pos]
+        line = self._padded_line
+        n = self._len
+        while self.pos <= n:
+            c = line[self.pos]
             if state == 'data':
                 if c == '&':
                     buffer = c
                     state = 'escape'
                 elif c == '<' and result == '':
                     state = 'tag'
-                elif c == '<' or c is None:
+                elif c == '<' or self.pos == n:
                     return ('text', result)
                 else:
-                    result += c
+                    result += self._consume(_TEXT_RUN_RE)
+                    continue
             elif state == 'escape':
-                if c == '<' or c is None:
+                if c == '<' or self.pos == n:
                     self.err('Incorrect escape.')
-                    m = re.search(r'^&#([0-9]+)$', buffer)
+                    m = _DECIMAL_ENTITY_RE.match(buffer)
                     if m:
                         result += from_char_code(int(m[1]))
                     else:
@@ -577,10 +635,12 @@ class WebVTTCueTextParser():
                     self.err('Incorrect escape.')
                     result += buffer
                     buffer = c
-                elif re.search(r'[a-z#0-9]', c, flags=re.IGNORECASE):
-                    buffer += c
+                elif m := _ESCAPE_RUN_RE.match(line, self.pos, n):
+                    buffer += m.group()
+                    self.pos = m.end()
+                    continue
                 elif c == ';':
-                    m = re.match(r'^&#(x?[0-9]+)$', buffer)
+                    m = _NUMERIC_ENTITY_RE.match(buffer)
                     if m:
                         if 'x' in m[1]:
                             result += from_char_code(int('0'+m[1], 16))
@@ -588,7 +648,8 @@ class WebVTTCueTextParser():
                             result += from_char_code(int(m[1]))
                     elif self.entities.get(buffer + c):
                         result += self.entities.get(buffer + c)
-                    elif any((k := x for x in self.entities.keys() if buffer.startswith(x))):
+                    elif self.entities_re and (m := self.entities_re.match(buffer)):
+                        k = m.group()
                         result += self.entities[k] + buffer[len(k):]+ c
                     else:
                         self.err('Incorrect escape.')
@@ -599,38 +660,39 @@ class WebVTTCueTextParser():
                     result += buffer + c
                     state = 'data'
             elif state == 'tag':
-                if c in ' \t\n\f':
+                if c == ' ' or c == '\t' or c == '\n' or c == '\f':
                     state = 'start tag annotation'
                 elif c == '.':
                     state = 'start tag class'
                 elif c == '/':
                     state = "end tag"
-                elif re.search(r'\d', c):
-                    result = c
-                    state = 'timestamp tag'
-                elif c == '>' or c is None:
+                elif c == '>' or self.pos == n:
                     if c == '>':
                         self.pos += 1
                     return ('start tag', '', [], '')
+                elif '0' <= c <= '9':
+                    result = c
+                    state = 'timestamp tag'
                 else:
                     result = c
                     state = 'start tag'
             elif state == 'start tag':
-                if c in ' \t\f':
+                if c == ' ' or c == '\t' or c == '\f':
                     state = 'start tag annotation'
                 elif c == '\n':
                     buffer = c
                     state = 'start tag annotation'
                 elif c == '.':
                     state = 'start tag class'
-                elif c == '>' or c is None:
+                elif c == '>' or self.pos == n:
                     if c == '>':
                         self.pos +=1
                     return ('start tag', result, [], '')
                 else:
-                    result += c
+                    result += self._consume(_TAG_NAME_RUN_RE)
+                    continue
             elif state == 'start tag class':
-                if c in ' \t\f':
+                if c == ' ' or c == '\t' or c == '\f':
                     if buffer:
                         classes.append(buffer)
                     buffer = ''
@@ -644,36 +706,40 @@ class WebVTTCueTextParser():
                     if buffer:
                         classes.append(buffer)
                     buffer = ''
-                elif c == '>' or c is None:
+                elif c == '>' or self.pos == n:
                     if c == '>':
                         self.pos += 1
                     if buffer:
                         classes.append(buffer)
                     return ('start tag', result, classes, '')
                 else:
-                    buffer += c
+                    buffer += self._consume(_TAG_NAME_RUN_RE)
+                    continue
             elif state == 'start tag annotation':
-                if c == '>' or c is None:
+                if c == '>' or self.pos == n:
                     if c == '>':
                         self.pos += 1
                     buffer = ' '.join(buffer.split())
                     return ('start tag', result, classes, buffer)
                 else:
-                    buffer +=c
+                    buffer += self._consume(_TAG_REST_RUN_RE)
+                    continue
             elif state == 'end tag':
-                if c == '>' or c is None:
+                if c == '>' or self.pos == n:
                     if c == '>':
                         self.pos +=1
                     return ('end tag', result)
                 else:
-                    result += c
+                    result += self._consume(_TAG_REST_RUN_RE)
+                    continue
             elif state == 'timestamp tag':
-                if c == '>' or c is None:
+                if c == '>' or self.pos == n:
                     if c == '>':
                         self.pos += 1
                     return ('timestamp', result)
                 else:
-                    result += c
+                    result += self._consume(_TAG_REST_RUN_RE)
+                    continue
             else:
                 self.err('Never happens.') #// The joke is it might.
             #// 8